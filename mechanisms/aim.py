@@ -133,7 +133,7 @@ class AIM(Mechanism):
         zeros = self.structural_zeros
         # NOTE: Haven't incorproated structural zeros back yet after refactoring
         model = estimation.mirror_descent(
-                data.domain, measurements, iters=self.max_iters, callback_fn=lambda *_: None
+                data.domain, measurements, iters=self.max_iters
         )
 
         t = 0
@@ -167,7 +167,7 @@ class AIM(Mechanism):
             pcliques = list(set(M.clique for M in measurements))
             potentials = model.potentials.expand(pcliques)
             model = estimation.mirror_descent(
-                    data.domain, measurements, iters=self.max_iters, potentials=potentials, callback_fn=lambda *_: None
+                    data.domain, measurements, iters=self.max_iters, potentials=potentials
             )
             w = model.project(cl).datavector()
             # print('Selected',cl,'Size',n,'Budget Used',rho_used/self.rho)
@@ -9,11 +9,14 @@ Note that we assume in this file that the data has been appropriately preprocess
 
 import numpy as np
 import itertools
+import functools
+import operator
 from mbi import (
     Dataset,
     Domain,
     estimation,
     junction_tree,
+    marginal_loss,
     LinearMeasurement,
     LinearMeasurement,
 )
@@ -25,24 +28,62 @@ from mbi import Factor
 import argparse
 
 
-def powerset(iterable):
-    "powerset([1,2,3]) --> (1,) (2,) (3,) (1,2) (1,3) (2,3) (1,2,3)"
-    s = list(iterable)
-    return itertools.chain.from_iterable(
-        itertools.combinations(s, r) for r in range(1, len(s) + 1)
-    )
+def clique_mask(clique, bits):
+    "clique_mask(('b', 'c'), {'a': 1, 'b': 2, 'c': 4}) --> 6"
+    return functools.reduce(operator.or_, (bits[a] for a in clique), 0)
 
 
-def downward_closure(Ws):
-    ans = set()
+def domain_masks(domain, cliques):
+    bits = {a: 1 << i for i, a in enumerate(domain.attrs)}
+    return {cl: clique_mask(cl, bits) for cl in cliques}
+
+
+def submasks(mask):
+    "submasks(0b101) --> 0b101 0b100 0b001"
+    sub = mask
+    while sub:
+        yield sub
+        sub = (sub - 1) & mask
+
+
+@functools.lru_cache(maxsize=None)
+def _downward_closure(Ws):
+    # Cliques are encoded as attribute bitmasks, so subsets are enumerated
+    # with integer arithmetic and permuted duplicates collapse to one entry.
+    attrs = dict.fromkeys(itertools.chain.from_iterable(Ws))
+    bits = {a: 1 << i for i, a in enumerate(attrs)}
+    ans = {}
     for proj in Ws:
-        ans.update(powerset(proj))
-    return list(sorted(ans, key=len))
+        for sub in submasks(clique_mask(proj, bits)):
+            if sub not in ans:
+                ans[sub] = tuple(a for a in proj if bits[a] & sub)
+    return tuple(sorted(ans.values(), key=len))
 
 
-def hypothetical_model_size(domain, cliques):
+def downward_closure(Ws):
+    # Keyed on the clique tuples themselves (not frozensets), since the
+    # attribute order of the returned subsets follows the order in Ws.
+    return list(_downward_closure(tuple(map(tuple, Ws))))
+
+
+def _normalize_cliques(cliques):
+    # Junction trees only depend on the cliques as sets of attributes,
+    # so normalize them to get cache hits across AIM rounds.
+    return tuple(sorted(set(tuple(sorted(cl)) for cl in cliques)))
+
+
+@functools.lru_cache(maxsize=None)
+def _junction_tree_cliques(domain, cliques):
     jtree, _ = junction_tree.make_junction_tree(domain, cliques)
-    maximal_cliques = junction_tree.maximal_cliques(jtree)
+    return tuple(junction_tree.maximal_cliques(jtree))
+
+
+def junction_tree_cliques(domain, cliques):
+    return list(_junction_tree_cliques(domain, _normalize_cliques(cliques)))
+
+
+def hypothetical_model_size(domain, cliques):
+    maximal_cliques = junction_tree_cliques(domain, cliques)
     cells = sum(domain.size(cl) for cl in maximal_cliques)
     size_mb = cells * 8 / 2**20
     return size_mb
@@ -50,30 +91,65 @@ def hypothetical_model_size(domain, cliques):
 
 def compile_workload(workload):
     weights = {cl: wt for (cl, wt) in workload}
-    workload_cliques = weights.keys()
+    workload_cliques = list(weights.keys())
+    candidates = downward_closure(workload_cliques)
 
-    def score(cl):
-        return sum(
-            weights[workload_cl] * len(set(cl) & set(workload_cl))
-            for workload_cl in workload_cliques
-        )
+    # score(cl) = sum_j weights[j] * |cl & workload_cliques[j]|, computed with
+    # attribute-indicator matrices instead of pairwise set intersections.
+    attrs = sorted(set(itertools.chain.from_iterable(workload_cliques)))
+    attr_index = {a: i for i, a in enumerate(attrs)}
+
+    def indicator(cliques):
+        A = np.zeros((len(cliques), len(attrs)))
+        for i, cl in enumerate(cliques):
+            A[i, [attr_index[a] for a in cl]] = 1
+        return A
 
-    return {cl: score(cl) for cl in downward_closure(workload_cliques)}
+    W = indicator(workload_cliques)
+    C = indicator(candidates)
+    scores = C @ (W.T @ np.array(list(weights.values()), dtype=float))
+    return dict(zip(candidates, scores.tolist()))
 
 
-def filter_candidates(candidates, model, size_limit):
+def filter_candidates(candidates, model, size_limit, candidate_masks=None):
     ans = {}
-    free_cliques = downward_closure(model.cliques)
+    if candidate_masks is None:
+        candidate_masks = domain_masks(model.domain, candidates)
+    # The current model's junction tree is computed once per round.  A candidate
+    # inside one of its maximal cliques adds no edges to the triangulated graph,
+    # so it is free; only the other candidates need a new junction tree.
+    jtree_cliques = junction_tree_cliques(model.domain, model.cliques)
+    model_masks = domain_masks(model.domain, jtree_cliques).values()
     for cl in candidates:
-        cond1 = (
+        # cond2 is a cheap subset test, so check it before building a junction tree
+        mask = candidate_masks[cl]
+        cond2 = any(mask & m == mask for m in model_masks)
+        if cond2 or (
             hypothetical_model_size(model.domain, model.cliques + [cl]) <= size_limit
-        )
-        cond2 = cl in free_cliques
-        if cond1 or cond2:
+        ):
             ans[cl] = candidates[cl]
     return ans
 
 
+def marginal_answers(data, cliques):
+    # Histogram the data once per maximal clique and marginalize those
+    # factors to answer every subset, rather than re-projecting the data.
+    masks = domain_masks(data.domain, cliques)
+    maximal = []
+    for cl in sorted(cliques, key=len, reverse=True):
+        if not any(masks[cl] & masks[cl2] == masks[cl] for cl2 in maximal):
+            maximal.append(cl)
+    factors = {
+        cl: Factor(data.domain.project(cl), data.project(cl).datavector(flatten=False))
+        for cl in maximal
+    }
+    answers = {}
+    for cl in cliques:
+        parent = next(cl2 for cl2 in maximal if masks[cl] & masks[cl2] == masks[cl])
+        answers[cl] = np.asarray(factors[parent].project(cl).datavector())
+    return answers
+
+
 class AIM(Mechanism):
     def __init__(
         self,
@@ -94,23 +170,25 @@ class AIM(Mechanism):
 
     def worst_approximated(self, candidates, answers, model, rho):
         sigma = np.sqrt(1/(2*rho))
-        errors = {}
-        sensitivity = {}
-        for cl in candidates:
-            wgt = candidates[cl]
-            x = answers[cl]
-            bias = np.sqrt(2 / np.pi) * sigma * model.domain.size(cl)
-            xest = model.project(cl).datavector()
-            errors[cl] = wgt * (np.linalg.norm(x - xest, 1) - bias)
-            sensitivity[cl] = abs(wgt)
+        cliques = list(candidates)
+        sizes = np.array([model.domain.size(cl) for cl in cliques])
+        wgts = np.array([candidates[cl] for cl in cliques], dtype=float)
+        biases = np.sqrt(2 / np.pi) * sigma * sizes
+
+        # Write all residuals into one flat buffer, then compute every L1 norm
+        # with a single reduction over the clique offsets.
+        offsets = np.cumsum(np.concatenate([[0], sizes]))
+        buf = np.empty(offsets[-1])
+        for i, cl in enumerate(cliques):
+            xest = np.asarray(model.project(cl).datavector())
+            buf[offsets[i]:offsets[i+1]] = answers[cl] - xest
+        l1 = np.add.reduceat(np.abs(buf), offsets[:-1])
+        errors = wgts * (l1 - biases)
+
+        max_sensitivity = np.abs(wgts).max()  # if all weights are 0, could be a problem
 
-        max_sensitivity = max(
-            sensitivity.values()
-        )  # if all weights are 0, could be a problem
-
-        # TODO: probably easiest to use gumbel noise here
         epsilon = np.sqrt(8*rho)
-        return self.exponential_mechanism(errors, epsilon, max_sensitivity)
+        return cliques[self.gumbel_mechanism(errors, epsilon, max_sensitivity)]
 
     def zcdp_gaussian_mech(self, val, sensitivity, rho):
         self.rho_used += rho
@@ -120,7 +198,8 @@ class AIM(Mechanism):
     def run(self, data, workload, num_synth_rows=None, initial_cliques=None):
         rounds = self.rounds or 16 * len(data.domain)
         candidates = compile_workload(workload)
-        answers = {cl: data.project(cl).datavector() for cl in candidates}
+        answers = marginal_answers(data, list(candidates))
+        candidate_masks = domain_masks(data.domain, candidates)
         rho_oneway = self.rho * .05
         rho_iterations = self.rho * .95
 
@@ -134,7 +213,7 @@ class AIM(Mechanism):
         measurements = []
         rho_oneway_i = rho_oneway / len(oneway)
         for cl in initial_cliques:
-            x = data.project(cl).datavector()
+            x = answers[cl] if cl in answers else data.project(cl).datavector()
             y = self.zcdp_gaussian_mech(x, sensitivity=1, rho=rho_oneway_i)
             std = np.sqrt(1/(2*rho_oneway_i))
             measurements.append(LinearMeasurement(y, cl, stddev=std))
@@ -142,7 +221,7 @@ class AIM(Mechanism):
         zeros = self.structural_zeros
         # NOTE: Haven't incorproated structural zeros back yet after refactoring
         model = estimation.mirror_descent(
-                data.domain, measurements, iters=self.max_iters, callback_fn=lambda *_: None
+                data.domain, measurements, iters=self.max_iters
         )
 
         iterations = int(len(workload)/4)
@@ -151,21 +230,28 @@ class AIM(Mechanism):
         print(f'Running {iterations} iterations...')
         for t in range(iterations):
             size_limit = self.max_model_size * self.rho_used / self.rho
-            small_candidates = filter_candidates(candidates, model, size_limit)
+            small_candidates = filter_candidates(
+                candidates, model, size_limit, candidate_masks
+            )
             cl = self.worst_approximated(small_candidates, answers, model, rho_iters_i/2)
             print('Measuring Clique', cl)
             n = data.domain.size(cl)
-            x = data.project(cl).datavector()
+            x = answers[cl]
             y = self.zcdp_gaussian_mech(x, sensitivity=1, rho=rho_iters_i/2)
             std = np.sqrt(1/(2*rho_oneway_i))
             measurements.append(LinearMeasurement(y, cl, stddev=std))
 
-            # Warm start potentials from prior round
-            # TODO: check if it helps to call maximal_subsets here
-            pcliques = list(set(M.clique for M in measurements))
-            potentials = model.potentials.expand(pcliques)
+            # Warm start potentials from prior round.  Only the maximal measured
+            # cliques are kept, in a deterministic order, so the potentials are
+            # reused as-is whenever the selected clique is already covered by
+            # the model.  mirror_descent is still recompiled every round, since
+            # each new measurement changes the loss function's pytree structure.
+            pcliques = marginal_loss.maximal_subset([M.clique for M in measurements])
+            potentials = model.potentials
+            if pcliques != potentials.cliques:
+                potentials = potentials.expand(pcliques)
             model = estimation.mirror_descent(
-                    data.domain, measurements, iters=self.max_iters, potentials=potentials, callback_fn=lambda *_: None
+                    data.domain, measurements, iters=self.max_iters, potentials=potentials
             )
             # print('Selected',cl,'Size',n,'Budget Used',rho_used/self.rho)
 
@@ -179,6 +265,23 @@ class AIM(Mechanism):
         return model, synth
 
 
+def bounded_combinations(domain, degree, max_cells):
+    "Like itertools.combinations(domain, degree), skipping cliques with more than max_cells cells"
+    attrs = list(domain)
+    sizes = [domain.size([a]) for a in attrs]
+
+    def extend(start, clique, cells):
+        if len(clique) == degree:
+            yield tuple(clique)
+            return
+        for i in range(start, len(attrs)):
+            # Cell counts only grow as attributes are added, so prune early.
+            if cells * sizes[i] <= max_cells:
+                yield from extend(i + 1, clique + [attrs[i]], cells * sizes[i])
+
+    return extend(0, [], 1)
+
+
 def default_params():
     """
     Return default parameters to run this program
@@ -229,8 +332,7 @@ if __name__ == "__main__":
 
     data = Dataset.load(args.dataset, args.domain)
 
-    workload = list(itertools.combinations(data.domain, args.degree))
-    workload = [cl for cl in workload if data.domain.size(cl) <= args.max_cells]
+    workload = list(bounded_combinations(data.domain, args.degree, args.max_cells))
     if args.num_marginals is not None:
         workload = [
             workload[i]
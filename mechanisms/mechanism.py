@@ -70,6 +70,12 @@ class Mechanism:
             if np.random.rand() <= p[i]:
                 return i
 
+    def gumbel_mechanism(self, qualities, epsilon, sensitivity=1.0):
+        """ Sample a candidate index from the exponential mechanism via the Gumbel-max trick """
+        scale = 2.0 * sensitivity / epsilon
+        noisy = qualities + self.prng.gumbel(0, scale, qualities.size)
+        return np.argmax(noisy)
+
     def exponential_mechanism(
         self, qualities, epsilon, sensitivity=1.0, base_measure=None
     ):
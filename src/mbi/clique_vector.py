@@ -24,9 +24,12 @@ def reverse_clique_mapping(
       A mapping from maximal cliques to cliques they contain.
     """
     mapping = {cl: [] for cl in maximal_cliques}
+    # Build each attribute set once, rather than once per (clique, maximal) pair.
+    maximal_sets = [(cl2, frozenset(cl2)) for cl2 in maximal_cliques]
     for cl in all_cliques:
-        for cl2 in maximal_cliques:
-            if set(cl) <= set(cl2):
+        attrs = frozenset(cl)
+        for cl2, attrs2 in maximal_sets:
+            if attrs <= attrs2:
                 mapping[cl2].append(cl)
                 break
     return mapping
@@ -57,21 +60,27 @@ class CliqueVector:
             raise ValueError("Cliques must be unique.")
 
     @classmethod
-    def zeros(cls, domain: Domain, cliques: list[Clique]) -> "CliqueVector":
+    def zeros(
+        cls, domain: Domain, cliques: list[Clique], dtype: jnp.dtype | None = None
+    ) -> "CliqueVector":
         cliques = [tuple(cl) for cl in cliques]
-        arrays = {cl: Factor.zeros(domain.project(cl)) for cl in cliques}
+        arrays = {cl: Factor.zeros(domain.project(cl), dtype) for cl in cliques}
         return cls(domain, cliques, arrays)
 
     @classmethod
-    def ones(cls, domain: Domain, cliques: list[Clique]) -> "CliqueVector":
+    def ones(
+        cls, domain: Domain, cliques: list[Clique], dtype: jnp.dtype | None = None
+    ) -> "CliqueVector":
         cliques = [tuple(cl) for cl in cliques]
-        arrays = {cl: Factor.ones(domain.project(cl)) for cl in cliques}
+        arrays = {cl: Factor.ones(domain.project(cl), dtype) for cl in cliques}
         return cls(domain, cliques, arrays)
 
     @classmethod
-    def uniform(cls, domain: Domain, cliques: list[Clique]) -> "CliqueVector":
+    def uniform(
+        cls, domain: Domain, cliques: list[Clique], dtype: jnp.dtype | None = None
+    ) -> "CliqueVector":
         cliques = [tuple(cl) for cl in cliques]
-        arrays = {cl: Factor.uniform(domain.project(cl)) for cl in cliques}
+        arrays = {cl: Factor.uniform(domain.project(cl), dtype) for cl in cliques}
         return cls(domain, cliques, arrays)
 
     @classmethod
@@ -91,11 +100,19 @@ class CliqueVector:
         domains = [self.domain.project(cl) for cl in self.cliques]
         return functools.reduce(lambda a, b: a.merge(b), domains, Domain([], []))
 
-    # @functools.lru_cache(maxsize=None)
+    @functools.cached_property
+    def _parent_map(self) -> dict[Clique, Clique | None]:
+        # Filled lazily by parent; a plain dict rather than lru_cache on the
+        # method, which would key on (and keep alive) every instance.
+        return {}
+
     def parent(self, clique: Clique) -> Clique | None:
-        for result in self.cliques:
-            if set(clique) <= set(result):
-                return result
+        clique = tuple(clique)
+        if clique not in self._parent_map:
+            self._parent_map[clique] = next(
+                (cl for cl in self.cliques if set(clique) <= set(cl)), None
+            )
+        return self._parent_map[clique]
 
     def supports(self, clique: Clique) -> bool:
         return self.parent(clique) is not None
@@ -119,11 +136,14 @@ class CliqueVector:
             An expanded CliqueVector defined over the given set of cliques.
         """
         mapping = reverse_clique_mapping(cliques, self.cliques)
+        # New cliques take the dtype of the existing factors (e.g., bfloat16).
+        leaves = jax.tree.leaves(self)
+        dtype = jnp.result_type(*leaves) if leaves else None
         arrays = {}
         for cl in cliques:
             dom = self.domain.project(cl)
             if len(mapping[cl]) == 0:
-                arrays[cl] = Factor.zeros(dom)
+                arrays[cl] = Factor.zeros(dom, dtype)
             else:
                 arrays[cl] = sum(self[cl2] for cl2 in mapping[cl]).expand(dom)
         return CliqueVector(self.domain, cliques, arrays)
@@ -152,7 +172,9 @@ class CliqueVector:
         return jax.tree.map(lambda f: f + other, self)
 
     def __sub__(self, other: chex.Numeric | "CliqueVector") -> "CliqueVector":
-        return self + -1 * other
+        if isinstance(other, CliqueVector):
+            return jax.tree.map(jnp.subtract, self, other)
+        return jax.tree.map(lambda f: f - other, self)
 
     def exp(self) -> "CliqueVector":
         return jax.tree.map(jnp.exp, self)
@@ -161,8 +183,11 @@ class CliqueVector:
         return jax.tree.map(jnp.log, self)
 
     def dot(self, other: "CliqueVector") -> chex.Numeric:
-        is_leaf = lambda node: isinstance(node, Factor)
-        dots = jax.tree.map(Factor.dot, self, other, is_leaf=is_leaf)
+        # The pytree structure (which includes each Factor's domain) must match,
+        # so the leaves can be contracted directly without Factor.dot's checks.
+        # An elementwise product and sum (rather than a vdot) keeps full
+        # precision on accelerators that lower dot products to lower precision.
+        dots = jax.tree.map(lambda a, b: jnp.sum(a * b), self, other)
         return jax.tree.reduce(operator.add, dots, 0)
 
     def size(self):
@@ -16,7 +16,9 @@ import numpy as np
 from mbi import Domain, CliqueVector, Factor, LinearMeasurement
 from mbi import marginal_oracles, marginal_loss, synthetic_data
 from typing import Callable
+import functools
 import jax
+import jax.numpy as jnp
 import chex
 import attr
 import optax
@@ -32,12 +34,13 @@ class GraphicalModel:
     total: chex.Numeric = 1
 
     def project(self, attrs: tuple[str, ...]) -> Factor:
-        try:
+        # marginals.supports looks up (and memoizes) the covering clique, so
+        # variable elimination is only used for out-of-model queries.
+        if self.marginals.supports(attrs):
             return self.marginals.project(attrs)
-        except:
-            return marginal_oracles.variable_elimination(
-                self.potentials, attrs, self.total
-            )
+        return marginal_oracles.variable_elimination(
+            self.potentials, attrs, self.total
+        )
 
     def synthetic_data(self, rows: int | None = None):
         return synthetic_data.from_marginals(self, rows or self.total)
@@ -89,6 +92,78 @@ def _initialize(domain, loss_fn, known_total, potentials):
     return loss_fn, known_total, potentials
 
 
+def _call_oracle(marginal_oracle, stateful, theta, total, state):
+    if stateful:
+        return marginal_oracle(theta, total, state)
+    return marginal_oracle(theta, total), state
+
+
+# The update step is defined at the module level, with all state passed in
+# explicitly, so that the compiled function is reused across calls to
+# mirror_descent with the same pytree structure: the same cliques and the same
+# number (and cliques) of measurements.  Callers whose measurements change from
+# call to call, such as AIM adding one per round, get no reuse and compile
+# every time, so the caches are cleared once they exceed _MAX_CACHED_UPDATES.
+# The potentials and step size are donated, so XLA can write each iterate into
+# the previous one's buffers.
+_MAX_CACHED_UPDATES = 16
+
+
+@functools.partial(
+    jax.jit,
+    static_argnames=["marginal_oracle", "stateful", "line_search"],
+    donate_argnames=["theta", "alpha"],
+)
+def _mirror_descent_update(
+    theta, alpha, state, loss_fn, total, *, marginal_oracle, stateful, line_search
+):
+    mu, state = _call_oracle(marginal_oracle, stateful, theta, total, state)
+    loss, dL = jax.value_and_grad(loss_fn)(mu)
+
+    # Keep the potentials in their original dtype (e.g., bfloat16), since
+    # alpha and the loss may be computed in a wider type.
+    theta2 = jax.tree.map(lambda a, b: a.astype(b.dtype), theta - alpha * dL, theta)
+    if not line_search:
+        return theta2, loss, alpha, mu, state
+
+    mu2, _ = _call_oracle(marginal_oracle, stateful, theta2, total, state)
+    loss2 = loss_fn(mu2)
+
+    # Accumulate the directional derivative in at least float32 (only widening,
+    # so float64 runs are unaffected).
+    widen = lambda x: x.astype(jnp.promote_types(x.dtype, jnp.float32))
+    dL, dmu = jax.tree.map(widen, (dL, mu - mu2))
+    sufficient_decrease = loss - loss2 >= 0.5 * alpha * dL.dot(dmu)
+    alpha = jax.lax.select(sufficient_decrease, 1.01 * alpha, 0.5 * alpha)
+    theta = jax.lax.cond(sufficient_decrease, lambda: theta2, lambda: theta)
+    loss = jax.lax.select(sufficient_decrease, loss2, loss)
+
+    return theta, loss, alpha, mu, state
+
+
+@functools.partial(
+    jax.jit,
+    static_argnames=["marginal_oracle", "stateful", "line_search", "iters"],
+    donate_argnames=["theta", "alpha"],
+)
+def _mirror_descent_scan(
+    theta, alpha, state, loss_fn, total, *, marginal_oracle, stateful, line_search, iters
+):
+    static_args = dict(
+        marginal_oracle=marginal_oracle, stateful=stateful, line_search=line_search
+    )
+
+    def step(carry, _):
+        theta, alpha, state = carry
+        theta, _, alpha, _, state = _mirror_descent_update(
+            theta, alpha, state, loss_fn, total, **static_args
+        )
+        return (theta, alpha, state), None
+
+    carry, _ = jax.lax.scan(step, (theta, alpha, state), None, length=iters)
+    return carry
+
+
 def mirror_descent(
     domain: Domain,
     loss_fn: marginal_loss.MarginalLossFn | list[LinearMeasurement],
@@ -99,7 +174,7 @@ def mirror_descent(
     stateful: bool = False,
     iters: int = 1000,
     stepsize: float | None = None,
-    callback_fn: Callable[[CliqueVector], None] = lambda _: None,
+    callback_fn: Callable[[CliqueVector], None] | None = None,
 ):
     """Optimization using the Mirror Descent algorithm.
 
@@ -116,14 +191,17 @@ def mirror_descent(
         loss_fn: A MarginalLossFn or a list of Linear Measurements.
         known_total: The known or estimated number of records in the data.
         potentials: The initial potentials.  Must be defind over a set of cliques
-            that supports the cliques in the loss_fn.
+            that supports the cliques in the loss_fn.  Their dtype is preserved,
+            so e.g. bfloat16 potentials can be used to reduce memory traffic.
         marginal_oracle: The function to use to compute marginals from potentials.
         stateful: flag specifying whether the marginal_oracle is stateful or not
             (e.g., whether messages should be preserved from one call to the next).
         iters: The maximum number of optimization iterations.
         stepsize: The step size for the optimization.  If not provided, this algorithm
             will use a line search to automatically choose appropriate step sizes.
-        callback_fn: A function to call at each iteration with the iteration number
+        callback_fn: A function to call at each iteration with the current marginals.
+            If not provided, the optimization loop is compiled into a single
+            jax.lax.scan.
 
     Returns:
         A GraphicalModel object with the estimated potentials and marginals.
@@ -132,43 +210,42 @@ def mirror_descent(
         domain, loss_fn, known_total, potentials
     )
 
-    if not stateful:
-        stateless_oracle = marginal_oracle
-        marginal_oracle = lambda theta, total, state: (stateless_oracle(theta, total), state)
-    elif stepsize is None:
+    if stateful and stepsize is None:
         raise ValueError('Stepsize should be manually tuned when using a stateful oracle.')
 
-    @jax.jit
-    def update(theta, alpha, state = None):
-        mu, state = marginal_oracle(theta, known_total, state)
-        loss, dL = jax.value_and_grad(loss_fn)(mu)
-
-        theta2 = theta - alpha * dL
-        if stepsize is not None:
-            return theta2, loss, alpha, mu, state
-
-        mu2, _ = marginal_oracle(theta2, known_total, state)
-        loss2 = loss_fn(mu2)
-
-        sufficient_decrease = loss - loss2 >= 0.5 * alpha * dL.dot(mu - mu2)
-        alpha = jax.lax.select(sufficient_decrease, 1.01 * alpha, 0.5 * alpha)
-        theta = jax.lax.cond(sufficient_decrease, lambda: theta2, lambda: theta)
-        loss = jax.lax.select(sufficient_decrease, loss2, loss)
-
-        return theta, loss, alpha, mu, state
+    static_args = dict(
+        marginal_oracle=marginal_oracle, stateful=stateful, line_search=stepsize is None
+    )
+    total = jnp.array(known_total, dtype=float)
+    # The potentials are donated to the update below, so copy them to avoid
+    # invalidating arrays the caller (e.g., a previous model) still holds.
+    potentials = jax.tree.map(jnp.copy, potentials)
 
     # A reasonable initial learning rate seems to be 2.0 L / known_total,
     # where L is the Lipschitz constant.  Starting from a value too high
     # can be fine in some cases, but lead to incorrect behavior in others.
     # We don't currently take L as an argument, but for the most common case,
     # where our loss function is || mu - y ||_2^2, we have L = 1.
-    alpha = 2.0 / known_total if stepsize is None else stepsize
-    mu, state = marginal_oracle(potentials, known_total, state=None)
-    for t in range(iters):
-        potentials, loss, alpha, mu, state = update(potentials, alpha, state)
-        callback_fn(mu)
+    alpha = jnp.array(2.0 / known_total if stepsize is None else stepsize)
+    mu, state = _call_oracle(marginal_oracle, stateful, potentials, total, None)
+    if callback_fn is None:
+        # Without a callback there is nothing to do between iterations, so
+        # run the whole loop as one XLA program instead of dispatching per step.
+        potentials, alpha, state = _mirror_descent_scan(
+            potentials, alpha, state, loss_fn, total, iters=iters, **static_args
+        )
+    else:
+        for t in range(iters):
+            potentials, loss, alpha, mu, state = _mirror_descent_update(
+                potentials, alpha, state, loss_fn, total, **static_args
+            )
+            callback_fn(mu)
+
+    for fn in [_mirror_descent_scan, _mirror_descent_update]:
+        if fn._cache_size() > _MAX_CACHED_UPDATES:
+            fn.clear_cache()
 
-    marginals, _ = marginal_oracle(potentials, known_total, state)
+    marginals, _ = _call_oracle(marginal_oracle, stateful, potentials, total, state)
     return GraphicalModel(potentials, marginals, known_total)
 
 
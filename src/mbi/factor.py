@@ -32,12 +32,16 @@ class Factor:
 
     # Constructors
     @classmethod
-    def zeros(cls, domain: Domain) -> "Factor":
-        return cls(domain, jnp.zeros(domain.shape))
+    def zeros(cls, domain: Domain, dtype: jnp.dtype | None = None) -> "Factor":
+        return cls(domain, jnp.zeros(domain.shape, dtype=dtype))
 
     @classmethod
-    def ones(cls, domain: Domain) -> "Factor":
-        return cls(domain, jnp.ones(domain.shape))
+    def ones(cls, domain: Domain, dtype: jnp.dtype | None = None) -> "Factor":
+        return cls(domain, jnp.ones(domain.shape, dtype=dtype))
+
+    @classmethod
+    def uniform(cls, domain: Domain, dtype: jnp.dtype | None = None) -> "Factor":
+        return cls(domain, jnp.full(domain.shape, 1 / domain.size(), dtype=dtype))
 
     @classmethod
     def random(cls, domain: Domain) -> "Factor":
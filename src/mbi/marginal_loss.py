@@ -1,6 +1,7 @@
 import attr
 from typing import Any, Callable, TypeAlias, Protocol, Mapping
 from mbi import Factor, CliqueVector
+from mbi.factor import _try_convert
 
 import jax
 import jax.numpy as jnp
@@ -66,27 +67,69 @@ def clique_mapping(
 @functools.partial(
     jax.tree_util.register_dataclass,
     meta_fields=["clique", "stddev", "query"],
-    data_fields=["values"],
+    data_fields=["noisy_measurement"],
 )
 @attr.dataclass(frozen=True)
 class LinearMeasurement:
     """A class for representing a private linear measurement of a marginal."""
 
-    noisy_measurement: jax.Array = attr.field(converter=jnp.array)
+    noisy_measurement: jax.Array = attr.field(converter=_try_convert)
     clique: Clique = attr.field(converter=tuple)
     stddev: float = 1.0
     query: Callable[[jax.Array], jax.Array] = lambda x: x
 
 
+@functools.partial(
+    jax.tree_util.register_dataclass,
+    meta_fields=["cliques", "loss_fn"],
+    data_fields=["params"],
+)
 @attr.dataclass(frozen=True)
 class MarginalLossFn:
-    """A Loss function over the concatenated vector of marginals."""
+    """A Loss function over the concatenated vector of marginals.
+
+    If params is given, the loss is computed as loss_fn(marginals, params).
+    Since params are the data fields of this pytree, a MarginalLossFn can be
+    passed into a jitted function, and two loss functions that share the same
+    loss_fn, cliques, and params structure will reuse the same compiled code.
+    For linear measurements, the structure includes the number of measurements
+    and their cliques, so adding a measurement requires a recompile.
+    """
 
     cliques: list[Clique]
-    loss_fn: Callable[[CliqueVector], chex.Numeric]
+    loss_fn: Callable[..., chex.Numeric]
+    params: Any = None
 
     def __call__(self, marginals: CliqueVector) -> chex.Numeric:
-        return self.loss_fn(marginals)
+        if self.params is None:
+            return self.loss_fn(marginals)
+        return self.loss_fn(marginals, self.params)
+
+
+@functools.lru_cache(maxsize=None)
+def _linear_measurement_loss(norm: str, normalize: bool) -> Callable:
+    # Cached so that every loss function with the same settings shares the
+    # same (hashable) loss_fn, which is a static field of MarginalLossFn.
+    def loss_fn(
+        marginals: CliqueVector, measurements: list[LinearMeasurement]
+    ) -> chex.Numeric:
+        loss = 0.0
+        for M in measurements:
+            mu = marginals.project(M.clique).datavector()
+            diff = M.query(mu) - M.noisy_measurement
+            if norm == "l2":
+                loss += (diff @ diff) / (2 * M.stddev)
+            elif norm == "l1":
+                loss += jnp.sum(jnp.abs(diff)) / M.stddev
+
+        if normalize:
+            total = marginals.project([]).datavector(flatten=False)
+            loss = loss / len(measurements) / total
+            if norm == "l2":
+                loss = jnp.sqrt(loss)
+        return loss
+
+    return loss_fn
 
 
 def from_linear_measurements(
@@ -107,25 +150,8 @@ def from_linear_measurements(
         raise ValueError(f"Unknown norm {norm}.")
     cliques = [m.clique for m in measurements]
     maximal_cliques = maximal_subset(cliques)
-
-    def loss_fn(marginals: CliqueVector) -> chex.Numeric:
-        loss = 0.0
-        for M in measurements:
-            mu = marginals.project(M.clique).datavector()
-            diff = M.query(mu) - M.noisy_measurement
-            if norm == "l2":
-                loss += (diff @ diff) / (2 * M.stddev)
-            elif norm == "l1":
-                loss += jnp.sum(jnp.abs(diff)) / M.stddev
-
-        if normalize:
-            total = marginals.project([]).datavector(flatten=False)
-            loss = loss / len(measurements) / total
-            if norm == "l2":
-                loss = jnp.sqrt(loss)
-        return loss
-
-    return MarginalLossFn(maximal_cliques, loss_fn)
+    loss_fn = _linear_measurement_loss(norm, normalize)
+    return MarginalLossFn(maximal_cliques, loss_fn, list(measurements))
 
 
 def primal_feasibility(mu: CliqueVector) -> chex.Numeric:
@@ -2,6 +2,7 @@ import unittest
 from mbi import Domain, Factor, CliqueVector
 from mbi import marginal_loss, estimation
 import numpy as np
+import jax.numpy as jnp
 from parameterized import parameterized
 import itertools
 
@@ -48,6 +49,82 @@ class TestEstimation(unittest.TestCase):
             actual = model.project(M.clique).datavector()
             np.testing.assert_allclose(actual, expected, atol=1e-2)
 
+    @parameterized.expand(itertools.product(_CLIQUE_SETS))
+    def test_mirror_descent_callback(self, cliques):
+        measurements = fake_measurements(cliques)
+        loss_fn = marginal_loss.from_linear_measurements(measurements)
+
+        calls = []
+        model1 = estimation.mirror_descent(
+            _DOMAIN, loss_fn, known_total=1.0, iters=50, callback_fn=calls.append
+        )
+        model2 = estimation.mirror_descent(_DOMAIN, loss_fn, known_total=1.0, iters=50)
+        self.assertEqual(len(calls), 50)
+        for cl in loss_fn.cliques:
+            expected = model1.project(cl).datavector()
+            actual = model2.project(cl).datavector()
+            np.testing.assert_allclose(actual, expected, atol=1e-6)
+
+    @parameterized.expand(itertools.product(_CLIQUE_SETS))
+    def test_mirror_descent_reuses_compiled_update(self, cliques):
+        estimation._mirror_descent_scan.clear_cache()  # Stay under the bound.
+        loss_fn = marginal_loss.from_linear_measurements(fake_measurements(cliques))
+        estimation.mirror_descent(_DOMAIN, loss_fn, known_total=1.0, iters=10)
+        cache_size = estimation._mirror_descent_scan._cache_size()
+
+        # Fresh measurements with the same cliques should not trigger a retrace.
+        loss_fn = marginal_loss.from_linear_measurements(fake_measurements(cliques))
+        estimation.mirror_descent(_DOMAIN, loss_fn, known_total=2.0, iters=10)
+        self.assertEqual(estimation._mirror_descent_scan._cache_size(), cache_size)
+
+    def test_mirror_descent_bounds_compiled_updates(self):
+        # Each new number of measurements is a new pytree structure to compile.
+        for n in range(1, estimation._MAX_CACHED_UPDATES + 3):
+            measurements = fake_measurements([("a", "b")] * n)
+            estimation.mirror_descent(_DOMAIN, measurements, known_total=1.0, iters=2)
+        size = estimation._mirror_descent_scan._cache_size()
+        self.assertLessEqual(size, estimation._MAX_CACHED_UPDATES)
+
+    @parameterized.expand(itertools.product(_CLIQUE_SETS))
+    def test_mirror_descent_bfloat16(self, cliques):
+        measurements = fake_measurements(cliques)
+        loss_fn = marginal_loss.from_linear_measurements(measurements)
+        potentials = CliqueVector.zeros(_DOMAIN, loss_fn.cliques, jnp.bfloat16)
+
+        model = estimation.mirror_descent(
+            _DOMAIN, loss_fn, known_total=1.0, potentials=potentials, iters=250
+        )
+        for cl in model.cliques:
+            self.assertEqual(model.potentials[cl].values.dtype, jnp.bfloat16)
+        for M in measurements:
+            expected = M.noisy_measurement
+            actual = model.project(M.clique).datavector().astype(float)
+            np.testing.assert_allclose(actual, expected, atol=5e-2)
+
+    def test_expand_keeps_dtype(self):
+        potentials = CliqueVector.zeros(_DOMAIN, [("a", "b", "c")], jnp.bfloat16)
+        expanded = potentials.expand([("a", "b", "c"), ("d",)])
+        for cl in expanded.cliques:
+            self.assertEqual(expanded[cl].values.dtype, jnp.bfloat16)
+
+    def test_dot_keeps_float64(self):
+        # The line search's directional derivative must not be narrowed.
+        x = CliqueVector.random(_DOMAIN, [("a", "b"), ("c", "d")])
+        self.assertEqual(x.dot(x).dtype, jnp.float64)
+
+    @parameterized.expand(itertools.product(_CLIQUE_SETS))
+    def test_mirror_descent_keeps_input_potentials(self, cliques):
+        measurements = fake_measurements(cliques)
+        loss_fn = marginal_loss.from_linear_measurements(measurements)
+        potentials = CliqueVector.zeros(_DOMAIN, loss_fn.cliques)
+
+        # The optimization donates its buffers; the caller's must stay valid.
+        estimation.mirror_descent(
+            _DOMAIN, loss_fn, known_total=1.0, potentials=potentials, iters=10
+        )
+        for cl in potentials.cliques:
+            np.testing.assert_allclose(potentials[cl].datavector(), 0.0)
+
     @parameterized.expand(itertools.product(_CLIQUE_SETS))
     def test_mirror_descent_l1(self, cliques):
         measurements = fake_measurements(cliques)